@@ -27,6 +27,17 @@ from oaaclient.templates import CustomApplication, OAAPermission
 import os
 import sys
 
+# Custom application permissions and the Veza effective permissions they map to
+PERMS = [
+    ("ViewDept", [OAAPermission.DataRead]),
+    ("EditDept", [OAAPermission.DataRead, OAAPermission.DataWrite]),
+    ("ApproveTime", [OAAPermission.DataRead, OAAPermission.DataWrite]),
+    ("AccessBranch", [OAAPermission.DataRead]),
+    ("OrderPaper", [OAAPermission.DataRead]),
+    ("ManagePricing", [OAAPermission.DataRead, OAAPermission.DataWrite]),
+    ("ManageWarehouse", [OAAPermission.DataRead, OAAPermission.DataWrite]),
+]
+
 def main():
 
     # OAA requires an API token, which you can generate from your Veza user profile
@@ -34,7 +45,7 @@ def main():
     # Making them available to your connector in this way keeps credentials out of the source code
     veza_api_key = os.getenv('VEZA_API_KEY')
     veza_url = os.getenv('VEZA_URL')
-    if None in (veza_url, veza_api_key):
+    if not veza_url or not veza_api_key:
         print("Unable to locate all environment variables")
         sys.exit(1)
 
@@ -51,13 +62,8 @@ def main():
     # In the OAA payload, each permission native to the custom app is mapped to the Veza effective permission (data/non-data C/R/U/D).
     # Permissions must be defined before they can be referenced, as they are discovered or ahead of time.
     # For each custom application permission, bind them to the Veza permissions using the `OAAPermission` enum:
-    custom_app.add_custom_permission("ViewDept", [OAAPermission.DataRead])
-    custom_app.add_custom_permission("EditDept", [OAAPermission.DataRead, OAAPermission.DataWrite])
-    custom_app.add_custom_permission("ApproveTime", [OAAPermission.DataRead, OAAPermission.DataWrite])
-    custom_app.add_custom_permission("AccessBranch", [OAAPermission.DataRead])
-    custom_app.add_custom_permission("OrderPaper", [OAAPermission.DataRead])
-    custom_app.add_custom_permission("ManagePricing", [OAAPermission.DataRead, OAAPermission.DataWrite])
-    custom_app.add_custom_permission("ManageWarehouse", [OAAPermission.DataRead, OAAPermission.DataWrite])
+    for perm_name, perm_types in PERMS:
+        custom_app.add_custom_permission(perm_name, perm_types)
 
     # Create resources and sub-resources to model the entities in the application
     # To Veza, an application can be a single entity or can contain resources and sub-resources
@@ -74,47 +80,46 @@ def main():
     letterhead_paper = custom_app.add_resource(name="Company Letterhead", resource_type="paper_type", description="Company Letterhead")
 
     # Define local users
-    custom_app.add_local_user("michael")
-    custom_app.local_users["michael"].add_identity("zwilson+Michael.Scott@veza.com")
-    #michael = custom_app.add_local_user("michael", identities="zwilson+Michael.Scott@veza.com")
+    michael = custom_app.add_local_user("michael")
+    michael.add_identity("zwilson+Michael.Scott@veza.com")
     #jim = custom_app.add_local_user("jim", identities="jim@dm.com", custom_attributes={"job_title": "Salesman", "branch": "Scranton"})
-    custom_app.add_local_user("jim")
-    #custom_app.local_users["jim"].add_identity("zwilson+Jim.Halpert@veza.com")
+    jim = custom_app.add_local_user("jim")
+    #jim.add_identity("zwilson+Jim.Halpert@veza.com")
     #pam = custom_app.add_local_user("pam", identities="pam@dm.com", custom_attributes={"job_title": "Receptionist", "branch": "Scranton"})
-    custom_app.add_local_user("pam")
-    #custom_app.local_users["pam"].add_identity("zwilson+pam@veza.com")
+    pam = custom_app.add_local_user("pam")
+    #pam.add_identity("zwilson+pam@veza.com")
     #dwight = custom_app.add_local_user("dwight", identities="dwight@dm.com", custom_attributes={"job_title": "Salesman", "branch": "Scranton"})
-    custom_app.add_local_user("dwight")
-    #custom_app.local_users["dwight"].add_identity("zwilson+Dwight.Schrute@veza.com")
+    dwight = custom_app.add_local_user("dwight")
+    #dwight.add_identity("zwilson+Dwight.Schrute@veza.com")
 
     # Define local groups
     custom_app.add_local_group("managers")
     custom_app.add_local_group("sales")
 
     # Assign users to groups
-    custom_app.local_users["michael"].add_group("managers")
-    custom_app.local_users["jim"].add_group("sales")
-    custom_app.local_users["dwight"].add_group("sales")
+    michael.add_group("managers")
+    jim.add_group("sales")
+    dwight.add_group("sales")
 
     # Assign permissions to users and groups
-    custom_app.local_users["michael"].add_permission(permission="ViewDept", resources=[management_dept])
-    custom_app.local_users["michael"].add_permission(permission="EditDept", resources=[management_dept])
-    custom_app.local_users["michael"].add_permission(permission="ApproveTime", resources=[management_dept])
-    custom_app.local_users["michael"].add_permission(permission="AccessBranch", resources=[scranton_branch])
-    custom_app.local_users["michael"].add_permission(permission="OrderPaper", resources=[bond_paper, letterhead_paper])
-    custom_app.local_users["michael"].add_permission(permission="ManagePricing", resources=[scranton_branch])
-    custom_app.local_users["michael"].add_permission(permission="ManageWarehouse", resources=[warehouse_dept])
-
-    custom_app.local_users["jim"].add_permission(permission="ViewDept", resources=[sales_dept])
-    custom_app.local_users["jim"].add_permission(permission="AccessBranch", resources=[scranton_branch])
-    custom_app.local_users["jim"].add_permission(permission="OrderPaper", resources=[bond_paper, letterhead_paper])
-
-    custom_app.local_users["pam"].add_permission(permission="ViewDept", resources=[management_dept])
-    custom_app.local_users["pam"].add_permission(permission="AccessBranch", resources=[scranton_branch])
-
-    custom_app.local_users["dwight"].add_permission(permission="ViewDept", resources=[sales_dept])
-    custom_app.local_users["dwight"].add_permission(permission="AccessBranch", resources=[scranton_branch])
-    custom_app.local_users["dwight"].add_permission(permission="ManageWarehouse", resources=[warehouse_dept])
+    michael.add_permission(permission="ViewDept", resources=[management_dept])
+    michael.add_permission(permission="EditDept", resources=[management_dept])
+    michael.add_permission(permission="ApproveTime", resources=[management_dept])
+    michael.add_permission(permission="AccessBranch", resources=[scranton_branch])
+    michael.add_permission(permission="OrderPaper", resources=[bond_paper, letterhead_paper])
+    michael.add_permission(permission="ManagePricing", resources=[scranton_branch])
+    michael.add_permission(permission="ManageWarehouse", resources=[warehouse_dept])
+
+    jim.add_permission(permission="ViewDept", resources=[sales_dept])
+    jim.add_permission(permission="AccessBranch", resources=[scranton_branch])
+    jim.add_permission(permission="OrderPaper", resources=[bond_paper, letterhead_paper])
+
+    pam.add_permission(permission="ViewDept", resources=[management_dept])
+    pam.add_permission(permission="AccessBranch", resources=[scranton_branch])
+
+    dwight.add_permission(permission="ViewDept", resources=[sales_dept])
+    dwight.add_permission(permission="AccessBranch", resources=[scranton_branch])
+    dwight.add_permission(permission="ManageWarehouse", resources=[warehouse_dept])
 
     # Once all authorizations have been mapped, the final step is to publish the app to Veza
     # Connect to the API to Push to Veza, define the provider and create if necessary:
@@ -5,10 +5,12 @@ Reads users, groups, resources, permissions, and identity-to-permissions mapping
 and maps them to the application and resources.
 
 To run the code, you will need to export environment variables for the Veza URL and API key.
+LOG_LEVEL sets the log level (default INFO); use DEBUG to log every entity and the full payload.
 
 Example:
 export VEZA_API_KEY="your_api_key_here"
 export VEZA_URL="https://your-veza-host"
+export LOG_LEVEL="DEBUG"  # optional
 ./dmi_app_csv.py
 
 Copyright 2022 Veza Technologies Inc.
@@ -19,18 +21,33 @@ https://opensource.org/licenses/MIT.
 """
 
 import csv
+import logging
 import os
 import sys
+import weakref
 import importlib.metadata
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from oaaclient.client import OAAClient, OAAClientError
 from oaaclient.templates import CustomApplication, OAAPermission, OAAPropertyType
 
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+log = logging.getLogger(__name__)
+
+# OAAPermission members by name, for resolving the permissions column of permissions.csv
+PERM_MAP = {perm.name: perm for perm in OAAPermission}
+
+# Spellings of boolean CSV fields that count as true
+TRUTHY = frozenset({"yes", "Yes", "YES", "true", "True", "TRUE", "1", "y", "Y"})
+
+# Read buffer for CSV inputs, large enough that big exports need few read() calls
+CSV_BUFFER_SIZE = 1 << 20
+
 def read_csv_file(file_path):
-    """Read a CSV file and return a list of dictionaries."""
+    """Read a CSV file and yield each row as a dictionary."""
     try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            return [row for row in reader]
+        with open(file_path, mode='r', encoding='utf-8', newline='', buffering=CSV_BUFFER_SIZE) as file:
+            yield from csv.DictReader(file)
     except FileNotFoundError:
         print(f"Error: CSV file {file_path} not found", file=sys.stderr)
         sys.exit(1)
@@ -38,6 +55,51 @@ def read_csv_file(file_path):
         print(f"Error reading CSV file {file_path}: {e}", file=sys.stderr)
         sys.exit(1)
 
+# Applications whose properties are already defined, without keeping the applications alive
+_property_defs_initialized = weakref.WeakSet()
+
+def _init_property_defs(app):
+    """Define the custom LocalUser properties on app, once per application.
+
+    Returns True if the properties are defined, False if the definitions failed.
+    """
+    if app in _property_defs_initialized:
+        return True
+    try:
+        define = app.property_definitions.define_local_user_property
+        _STR = OAAPropertyType.STRING
+        define("full_name", _STR)
+        define("job_title", _STR)
+        define("branch", _STR)
+        print("Defined custom properties: full_name, job_title, branch")
+    except Exception as e:
+        print(f"Warning: Failed to define properties via define_local_user_property: {e}", file=sys.stderr)
+        print("Falling back to setting properties directly")
+        return False
+    _property_defs_initialized.add(app)
+    return True
+
+def push_applications(veza_con, provider_name, apps, max_workers=8):
+    """Push each application to the provider and return the responses in the order of apps.
+
+    Pushes are network bound, so more than one application is pushed from a thread pool.
+    An OAAClientError from any push is raised to the caller.
+    """
+    def push(app):
+        return veza_con.push_application(
+            provider_name=provider_name,
+            data_source_name=f"{app.name} ({app.application_type})",
+            application_object=app,
+            save_json=False
+        )
+
+    if not apps:
+        return []
+    if len(apps) == 1:
+        return [push(apps[0])]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(apps))) as executor:
+        return list(executor.map(push, apps))
+
 def main():
     # Check oaaclient version
     try:
@@ -49,25 +111,20 @@ def main():
     # Load environment variables
     veza_api_key = os.getenv('VEZA_API_KEY')
     veza_url = os.getenv('VEZA_URL')
-    if None in (veza_url, veza_api_key):
+    if not veza_url or not veza_api_key:
         print("Unable to locate all environment variables", file=sys.stderr)
         sys.exit(1)
 
-    # Initialize OAA client
+    # Initialize OAA client once; it keeps a pooled HTTPS session that is reused
+    # for the provider lookup/creation and the push below
     veza_con = OAAClient(url=veza_url, api_key=veza_api_key)
 
     # Create CustomApplication instance
     custom_app = CustomApplication(name="DMIAPP", application_type="Custom")
 
-    # Define custom properties for LocalUser
-    try:
-        custom_app.property_definitions.define_local_user_property("full_name", OAAPropertyType.STRING)
-        custom_app.property_definitions.define_local_user_property("job_title", OAAPropertyType.STRING)
-        custom_app.property_definitions.define_local_user_property("branch", OAAPropertyType.STRING)
-        print("Defined custom properties: full_name, job_title, branch")
-    except Exception as e:
-        print(f"Warning: Failed to define properties via define_local_user_property: {e}", file=sys.stderr)
-        print("Falling back to setting properties directly")
+    # Define custom properties for LocalUser. set_property validates against these
+    # definitions, so users fall back to the properties dict if they could not be defined
+    use_set_property = _init_property_defs(custom_app)
 
     # Define paths to CSV files
     csv_dir = "csv_data"
@@ -78,118 +135,140 @@ def main():
     identity_to_permissions_file = os.path.join(csv_dir, "identity_to_permissions.csv")
 
     # Read and process permissions
-    permissions_data = read_csv_file(permissions_file)
-    for perm in permissions_data:
-        perm_name = perm['name']
-        perm_types = [getattr(OAAPermission, p.strip()) for p in perm['permissions'].split(';')]
-        custom_app.add_custom_permission(perm_name, perm_types)
-
-    # Read and process resources
-    resources_data = read_csv_file(resources_file)
+    perm_map = PERM_MAP
+    add_custom_permission = custom_app.add_custom_permission
+    for perm in read_csv_file(permissions_file):
+        perm_types = [perm_map[p.strip()] for p in perm['permissions'].split(';')]
+        add_custom_permission(perm['name'], perm_types)
+
+    # Read resources, bucket them by parent and build them parents-first,
+    # so sub-resources may appear before their parent in the CSV
+    children_of = defaultdict(list)
+    for res in read_csv_file(resources_file):
+        children_of[res['parent_name'] or ''].append(res)
     resource_map = {}
-    for res in resources_data:
+    queue = deque((None, res) for res in children_of.pop('', ()))
+    while queue:
+        parent_resource, res = queue.popleft()
         name = res['name']
         resource_type = res['resource_type']
-        parent_name = res['parent_name'] if res['parent_name'] else None
         description = res['description'] if res['description'] else None
 
-        if parent_name:
-            parent_resource = resource_map.get(parent_name)
-            if not parent_resource:
-                print(f"Error: Parent resource {parent_name} not found for {name}", file=sys.stderr)
-                sys.exit(1)
-            resource = parent_resource.add_sub_resource(name=name, resource_type=resource_type, description=description)
-        else:
+        if parent_resource is None:
             resource = custom_app.add_resource(name=name, resource_type=resource_type, description=description)
+        else:
+            resource = parent_resource.add_sub_resource(name=name, resource_type=resource_type, description=description)
         resource_map[name] = resource
+        queue.extend((resource, child) for child in children_of.pop(name, ()))
+    if children_of:
+        for parent_name, orphans in children_of.items():
+            for res in orphans:
+                print(f"Error: Parent resource {parent_name} not found for {res['name']}", file=sys.stderr)
+        sys.exit(1)
 
-    # Read and process users
-    users_data = read_csv_file(users_file)
-    for user in users_data:
+    # Read and process groups first so users can be assigned to them as they are added
+    debug = log.isEnabledFor(logging.DEBUG)
+    for group in read_csv_file(groups_file):
+        group_name = group['name']
+        group_obj = custom_app.add_local_group(name=group_name)
+        if debug:
+            # Debug: Inspect group ID
+            group_dict = group_obj.to_dict()
+            group_id = getattr(group_obj, 'id', group_dict.get('id', group_dict.get('name', 'Not found')))
+            log.debug("LocalGroup %s ID: %s", group_name, group_id)
+            log.debug("LocalGroup %s to_dict: %s", group_name, group_dict)
+    log.info("Processed %d groups", len(custom_app.local_groups))
+
+    # Read and process users in one streaming pass, keeping only the user name -> full_name
+    # map that the identity-to-permissions mappings below need
+    full_name_by_name = {}
+    user_count = 0
+    properties_set = 0
+    group_assignments = 0
+    for user in read_csv_file(users_file):
         name = user.get('full_name', user['name'])
-        custom_app.add_local_user(name=name)
+        full_name_by_name[user['name']] = name
+        user_count += 1
+        local_user = custom_app.add_local_user(name=name)
         if user['identity']:
             # Option 1: Use email as identity
-            custom_app.local_users[name].add_identity(user['identity'])
+            local_user.add_identity(user['identity'])
             # Option 2: Use full_name as identity (uncomment to test)
-            # custom_app.local_users[name].add_identity(name)
-            print(f"Debug: Added identity {user['identity']} to user {name}")
+            # local_user.add_identity(name)
+            log.debug("Added identity %s to user %s", user['identity'], name)
         # Set custom attributes
         custom_attrs = {attr: user[attr] for attr in ['full_name', 'job_title', 'branch'] if user.get(attr)}
         if custom_attrs:
-            try:
+            if use_set_property:
                 for key, value in custom_attrs.items():
-                    custom_app.local_users[name].set_property(key, value)
-                print(f"Set properties for user {name} via set_property: {custom_attrs}")
-            except Exception as e:
-                print(f"Warning: Failed to set properties via set_property for {name}: {e}", file=sys.stderr)
-                # Fallback to direct properties dictionary
-                try:
-                    for key, value in custom_attrs.items():
-                        custom_app.local_users[name].properties[key] = value
-                    print(f"Set properties for user {name} via properties dict: {custom_attrs}")
-                except Exception as e2:
-                    print(f"Warning: Failed to set properties via properties dict for {name}: {e2}", file=sys.stderr)
-                    print(f"Debug: LocalUser attributes for {name}: {dir(custom_app.local_users[name])}", file=sys.stderr)
+                    local_user.set_property(key, value)
+            else:
+                local_user.properties.update(custom_attrs)
+            properties_set += len(custom_attrs)
+            log.debug("Set properties for user %s: %s", name, custom_attrs)
         if user.get('is_active'):
-            custom_app.local_users[name].is_active = user['is_active'].lower() == 'true'
-
-    # Read and process groups
-    groups_data = read_csv_file(groups_file)
-    for group in groups_data:
-        group_name = group['name']
-        custom_app.add_local_group(name=group_name)
-        # Debug: Inspect group ID
-        group_obj = custom_app.local_groups[group_name]
-        group_dict = group_obj.to_dict()
-        group_id = getattr(group_obj, 'id', group_dict.get('id', group_dict.get('name', 'Not found')))
-        print(f"Debug: LocalGroup {group_name} ID: {group_id}")
-        print(f"Debug: LocalGroup {group_name} to_dict: {group_dict}")
-
-    # Assign users to groups
-    for user in users_data:
-        if user.get('groups'):
-            for group_name in user['groups'].split(';'):
+            local_user.is_active = user['is_active'] in TRUTHY
+        # Assign user to groups
+        groups_str = user.get('groups')
+        if groups_str:
+            for group_name in groups_str.split(';'):
                 if group_name in custom_app.local_groups:
-                    custom_app.local_users[user['full_name']].add_group(group_name)
-                    print(f"Debug: Assigned user {user['full_name']} to group {group_name}")
+                    local_user.add_group(group_name)
+                    group_assignments += 1
+                    log.debug("Assigned user %s to group %s", name, group_name)
+    log.info("Processed %d users, %d properties set, %d group assignments",
+             user_count, properties_set, group_assignments)
 
-    # Read and process identity-to-permissions mappings
-    identity_to_permissions_data = read_csv_file(identity_to_permissions_file)
-    for mapping in identity_to_permissions_data:
+    # Read and validate identity-to-permissions mappings, reporting every invalid row at once
+    valid_mappings = []
+    invalid_mappings = []
+    for row_num, mapping in enumerate(read_csv_file(identity_to_permissions_file), start=1):
         identity = mapping['identity']
         identity_type = mapping['identity_type']
-        permission = mapping['permission']
-        resource_name = mapping['resource_name'] if mapping['resource_name'] else None
+        resource_name = mapping['resource_name']
 
         if identity_type == 'local_user':
             # Map identity to full_name
-            user = next((u for u in users_data if u['name'] == identity), None)
-            if not user or user['full_name'] not in custom_app.local_users:
-                print(f"Error: User {identity} not found", file=sys.stderr)
+            full_name = full_name_by_name.get(identity)
+            if full_name is None or full_name not in custom_app.local_users:
+                invalid_mappings.append(f"row {row_num}: User {identity} not found")
                 continue
-            entity = custom_app.local_users[user['full_name']]
-            print(f"Debug: Mapped identity {identity} to user {user['full_name']}")
+            entity = custom_app.local_users[full_name]
+            log.debug("Mapped identity %s to user %s", identity, full_name)
         elif identity_type == 'local_group':
-            if identity not in custom_app.local_groups:
-                print(f"Error: Group {identity} not found", file=sys.stderr)
+            entity = custom_app.local_groups.get(identity)
+            if entity is None:
+                invalid_mappings.append(f"row {row_num}: Group {identity} not found")
                 continue
-            entity = custom_app.local_groups[identity]
         else:
-            print(f"Error: Invalid identity_type {identity_type} for {identity}", file=sys.stderr)
+            invalid_mappings.append(f"row {row_num}: Invalid identity_type {identity_type} for {identity}")
             continue
 
         if resource_name:
             resource = resource_map.get(resource_name)
-            if not resource:
-                print(f"Error: Resource {resource_name} not found for {identity}", file=sys.stderr)
+            if resource is None:
+                invalid_mappings.append(f"row {row_num}: Resource {resource_name} not found for {identity}")
                 continue
+        else:
+            resource = None
+        valid_mappings.append((entity, mapping['permission'], resource))
+
+    if invalid_mappings:
+        print(f"Error: Skipping {len(invalid_mappings)} invalid identity-to-permissions mappings:", file=sys.stderr)
+        for msg in invalid_mappings:
+            print(f"  -- {msg}", file=sys.stderr)
+
+    # Apply the valid mappings
+    for entity, permission, resource in valid_mappings:
+        if resource is not None:
             entity.add_permission(permission=permission, resources=[resource])
         else:
             entity.add_permission(permission=permission, apply_to_application=True)
+    log.info("Mapped %d identity permissions", len(valid_mappings))
 
-    # Debug: Inspect full payload
-    print(f"Debug: CustomApplication payload: {custom_app.app_dict()}")
+    # Debug: Inspect full payload, only built when debug logging is enabled
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("CustomApplication payload: %s", custom_app.app_dict())
 
     # Push the metadata payload to Veza
     provider_name = "DMI_APP"
@@ -201,16 +280,11 @@ def main():
         provider = veza_con.create_provider(provider_name, "application")
 
     try:
-        response = veza_con.push_application(
-            provider_name=provider_name,
-            data_source_name=f"{custom_app.name} ({custom_app.application_type})",
-            application_object=custom_app,
-            save_json=False
-        )
-        if response.get("warnings", None):
-            print("-- Push succeeded with warnings:")
-            for e in response["warnings"]:
-                print(f"  - {e}")
+        for response in push_applications(veza_con, provider_name, [custom_app]):
+            if response.get("warnings", None):
+                print("-- Push succeeded with warnings:")
+                for e in response["warnings"]:
+                    print(f"  - {e}")
     except OAAClientError as e:
         print(f"-- Error: {e.error}: {e.message} ({e.status_code})", file=sys.stderr)
         if hasattr(e, "details"):
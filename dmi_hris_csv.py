@@ -1,85 +1,173 @@
 #!/usr/bin/env python3
+"""Uses the HRISProvider class to create an OAA HRIS from a CSV export.
+
+Reads employees from the HRIS CSV export and maps them, their departments and managers to the HRIS.
+
+To run the code, you will need to export environment variables for the Veza URL and API key.
+LOG_LEVEL sets the log level (default INFO); use DEBUG to log every entity and the full payload.
+
+Example:
+export VEZA_API_KEY="your_api_key_here"
+export VEZA_URL="https://your-veza-host"
+export LOG_LEVEL="DEBUG"  # optional
+./dmi_hris_csv.py
+"""
+
 import csv
-import json
 import logging
+import os
+import sys
+import weakref
+import importlib.metadata
 from oaaclient.client import OAAClient, OAAClientError
 from oaaclient.templates import HRISProvider, OAAPropertyType
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 log = logging.getLogger(__name__)
 
+# Spellings of boolean CSV fields that count as true
+TRUTHY = frozenset({"yes", "Yes", "YES", "true", "True", "TRUE", "1", "y", "Y"})
+
+# Buffer size for reading the HRIS export
+CSV_BUFFER_SIZE = 1 << 20
+
+# Providers whose properties are already defined, without keeping the providers alive
+_property_defs_initialized = weakref.WeakSet()
+
+def _init_property_defs(provider):
+    """Define the custom employee properties on provider, once per provider."""
+    if provider in _property_defs_initialized:
+        return
+    _STR, _TS, _BOOL = OAAPropertyType.STRING, OAAPropertyType.TIMESTAMP, OAAPropertyType.BOOLEAN
+    define = provider.property_definitions.define_employee_property
+    define("full_name", _STR)
+    define("job_title", _STR)
+    define("department", _STR)
+    define("location", _STR)
+    define("start_date", _TS)
+    define("status", _STR)
+    define("shift", _STR)
+    define("remote", _BOOL)
+    define("loa", _BOOL)
+    _property_defs_initialized.add(provider)
+    log.info("Defined custom properties: full_name, job_title, department, location, start_date, status, shift, remote, loa")
+
 def main():
+    # Load environment variables
+    veza_api_key = os.getenv("VEZA_API_KEY")
+    veza_url = os.getenv("VEZA_URL")
+    if not veza_url or not veza_api_key:
+        log.error("Unable to locate all environment variables")
+        sys.exit(1)
+
+    # Initialize OAA client once; it keeps a pooled HTTPS session for every call made below
+    veza_con = OAAClient(url=veza_url, api_key=veza_api_key)
+
     # Initialize HRIS provider
     hris = HRISProvider(
         name="DMI_HRIS",
         hris_type="custom",
-        description="Dunder Mifflin HRIS"
+        url=""
     )
-    log.info(f"Debug: Using oaaclient version {OAAClient.__version__}")
+    try:
+        log.info("Using oaaclient version %s", importlib.metadata.version("oaaclient"))
+    except importlib.metadata.PackageNotFoundError:
+        log.warning("Could not determine oaaclient version")
 
     # Define custom properties
-    hris.property_definitions.define_employee_property("full_name", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("job_title", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("department", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("location", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("start_date", OAAPropertyType.TIMESTAMP)
-    hris.property_definitions.define_employee_property("status", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("shift", OAAPropertyType.STRING)
-    hris.property_definitions.define_employee_property("remote", OAAPropertyType.BOOLEAN)
-    hris.property_definitions.define_employee_property("loa", OAAPropertyType.BOOLEAN)
-    log.info("Defined custom properties: full_name, job_title, department, location, start_date, status, shift, remote, loa")
+    _init_property_defs(hris)
 
     # Read CSV
     csv_path = "csv/01984444-5546-72a7-9f40-5fce598136ea_01984444-5606-740d-8bb5-f598fb6025f3.csv"
-    with open(csv_path, "r") as f:
-        reader = csv.DictReader(f)
+    seen_depts = set()
+    # employee_id -> (employee, manager ID), so managers can be linked once every employee exists
+    employees_by_id = {}
+    with open(csv_path, "r", newline="", buffering=CSV_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        # Resolve column positions once from the header instead of building a dict per row
+        idx = {h: i for i, h in enumerate(next(reader))}
+        FN, LN, EM, EID, ST = idx['FirstName'], idx['LastName'], idx['Email'], idx['employee_number'], idx['Status']
+        JT, DEPT, LOC, SD, SH = idx['JobTitle'], idx['Department'], idx['Location'], idx['StartDate'], idx['Shift']
+        REM, LOA, MGR = idx['Remote'], idx['LOA'], idx['ManagerID']
         for row in reader:
-            # Add employee
+            employee_id = row[EID]
+            full_name = f"{row[FN]} {row[LN]}"
+            status = row[ST]
+            department = row[DEPT]
+            manager_id = row[MGR]
+            remote = row[REM] in TRUTHY
+            loa = row[LOA] in TRUTHY
+
+            # Add employee, keyed by employee number so managers can reference it
             employee = hris.add_employee(
-                name=f"{row['FirstName']} {row['LastName']}",
-                identity=row['Email'],
-                employee_id=row['employee_number'],
-                is_active=row['Status'] == "Active"
+                unique_id=employee_id,
+                name=full_name,
+                employee_number=employee_id,
+                first_name=row[FN],
+                last_name=row[LN],
+                is_active=status == "Active",
+                employment_status=status
             )
-            log.info(f"Debug: Added identity {row['Email']} to employee {row['name']}")
+            employee.email = row[EM]
+            employees_by_id[employee_id] = (employee, manager_id)
+            log.debug("Added identity %s to employee %s", row[EM], full_name)
 
             # Set custom properties
-            employee.set_property("full_name", f"{row['FirstName']} {row['LastName']}")
-            employee.set_property("job_title", row['JobTitle'])
-            employee.set_property("department", row['Department'])
-            employee.set_property("location", row['Location'])
-            employee.set_property("start_date", row['StartDate'])
-            employee.set_property("status", row['Status'])
-            employee.set_property("shift", row['Shift'])
-            employee.set_property("remote", row['Remote'].lower() == "yes")
-            employee.set_property("loa", row['LOA'].lower() == "yes")
-            log.info(f"Set properties for employee {row['name']}: {employee.custom_properties}")
-
-            # Set manager (if valid)
-            if row['ManagerID']:
-                try:
-                    employee.set_manager(row['ManagerID'])
-                    log.info(f"Debug: Set manager {row['ManagerID']} for employee {row['name']}")
-                except Exception as e:
-                    log.warning(f"Failed to set manager {row['ManagerID']} for {row['name']}: {e}")
-
-            # Add to department as group (optional)
-            if row['Department']:
-                group = hris.add_group(name=row['Department'])
-                employee.add_groups([row['Department']])
-                log.info(f"Debug: Added {row['name']} to group {row['Department']}")
-
-    # Generate and print payload
-    payload = hris.get_payload()
-    log.info(f"Debug: HRISProvider payload: {json.dumps(payload, indent=2)}")
-
-    # Push to Veza
+            employee.custom_properties.update({
+                "full_name": full_name,
+                "job_title": row[JT],
+                "department": department,
+                "location": row[LOC],
+                "start_date": row[SD],
+                "status": status,
+                "shift": row[SH],
+                "remote": remote,
+                "loa": loa,
+            })
+            log.debug("Set properties for employee %s: %s", full_name, employee.custom_properties)
+
+            # Add to department as group (optional); the group ID is the department name
+            if department:
+                if department not in seen_depts:
+                    hris.add_group(unique_id=department, name=department, group_type="Department")
+                    seen_depts.add(department)
+                employee.department = department
+                employee.add_group(department)
+                log.debug("Added %s to group %s", full_name, department)
+
+    # Set managers now that every employee is registered, regardless of CSV order
+    managers_set = 0
+    for employee_id, (employee, manager_id) in employees_by_id.items():
+        if not manager_id:
+            continue
+        if manager_id not in employees_by_id:
+            log.warning("Manager %s not found for employee %s", manager_id, employee_id)
+            continue
+        employee.add_manager(manager_id)
+        managers_set += 1
+        log.debug("Set manager %s for employee %s", manager_id, employee_id)
+    log.info("Processed %d employees, %d managers set, %d department groups",
+             len(employees_by_id), managers_set, len(seen_depts))
+
+    # Debug: Inspect full payload, only built when debug logging is enabled
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("HRISProvider payload: %s", hris.get_payload())
+
+    # Push to Veza, letting the client build the payload from the provider object
+    provider_name = "DMI_HRIS"
+    provider = veza_con.get_provider(provider_name)
+    if provider:
+        log.info("Found existing provider: %s (%s)", provider['name'], provider['id'])
+    else:
+        log.info("Creating Provider %s", provider_name)
+        veza_con.create_provider(provider_name, "hris")
+
     try:
-        client = OAAClient(url=os.getenv("VEZA_URL"), token=os.getenv("VEZA_API_KEY"))
-        client.push_hris_metadata(
-            provider_name="DMI_HRIS",
-            hris_type="custom",
-            metadata=payload
+        veza_con.push_application(
+            provider_name=provider_name,
+            data_source_name=f"{hris.name} ({hris.hris_type})",
+            application_object=hris,
+            save_json=False
         )
         log.info("HRIS data push succeeded")
     except OAAClientError as e:
@@ -4,10 +4,14 @@
 Reads users, groups, and group memberships from CSV files and maps them to the IdP.
 
 To run the code, you will need to export environment variables for the Veza URL and API key.
+LOG_LEVEL sets the log level (default INFO); use DEBUG to log every entity and the full payload.
+Set DMI_TRUSTED_CSV=true to parse the groups and memberships files with the faster
+split-based reader (see iter_csv_rows); only do so for machine-generated files.
 
 Example:
 export VEZA_API_KEY="your_api_key_here"
 export VEZA_URL="https://your-veza-host"
+export LOG_LEVEL="DEBUG"  # optional
 ./dmi_idp_csv.py
 
 Copyright 2022 Veza Technologies Inc.
@@ -18,18 +22,124 @@ https://opensource.org/licenses/MIT.
 """
 
 import csv
+import logging
 import os
 import sys
 import importlib.metadata
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from operator import itemgetter
 from oaaclient.client import OAAClient, OAAClientError
 from oaaclient.templates import CustomIdPProvider, OAAPropertyType
 
-def read_csv_file(file_path):
-    """Read a CSV file and return a list of dictionaries."""
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:
+    # pyarrow is optional; without it every CSV is parsed with the csv module
+    pyarrow = None
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+log = logging.getLogger(__name__)
+
+# Columns of idp_users.csv used to build users; only identity is required, missing ones read as ''
+USER_COLUMNS = ('identity', 'full_name', 'job_title', 'department', 'is_active')
+
+# Columns of idp_users.csv copied onto each user as custom properties
+USER_PROPERTY_COLUMNS = ('full_name', 'job_title', 'department')
+
+# Spellings of boolean CSV fields that count as true
+TRUTHY = frozenset({"yes", "Yes", "YES", "true", "True", "TRUE", "1", "y", "Y"})
+
+# CSV read buffer size (1 MiB)
+CSV_BUFFER_SIZE = 1 << 20
+
+# CSV files at least this large are parsed with pyarrow, in blocks of ARROW_BLOCK_SIZE
+ARROW_MIN_BYTES = 8 << 20
+ARROW_BLOCK_SIZE = 1 << 22
+
+class _LazyDir:
+    """Log argument that renders dir(obj) only if the record is actually formatted."""
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return str(dir(self.obj))
+
+def _iter_arrow_rows(file_path, columns, header):
+    """Parse a memory-mapped CSV file with pyarrow and return an iterator of tuples of the given columns.
+
+    Columns missing from header are read as ''.
+    """
+    present = [col for col in columns if col in header]
+    with pyarrow.memory_map(file_path, 'r') as source:
+        table = pyarrow.csv.read_csv(
+            source,
+            read_options=pyarrow.csv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+            convert_options=pyarrow.csv.ConvertOptions(
+                include_columns=present,
+                column_types={col: pyarrow.string() for col in present},
+                strings_can_be_null=False,
+            ),
+        )
+    return zip(*(table.column(col).to_pylist() if col in header else repeat('', table.num_rows)
+                 for col in columns))
+
+def _blank(row):
+    """Getter for a CSV column missing from the header."""
+    return ''
+
+def iter_csv_rows(file_path, columns, required=None, strict_csv=True):
+    """Read a CSV file and yield the given columns of each row as a namedtuple.
+
+    Only the required columns (all of columns by default) must be in the header;
+    other columns missing from it are read as ''.
+    Files of at least ARROW_MIN_BYTES are parsed with pyarrow when it is installed.
+    Pass strict_csv=False for trusted, machine-generated files; their lines are then
+    split on commas instead of going through the csv module. Lines containing a quote
+    are still parsed with the csv module, but each physical line on its own, so quoted
+    fields spanning several lines are mis-parsed.
+    """
+    Row = namedtuple('Row', columns)
+    if required is None:
+        required = columns
     try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            return [row for row in reader]
+        with open(file_path, mode='r', encoding='utf-8', newline='', buffering=CSV_BUFFER_SIZE) as file:
+            if strict_csv:
+                reader = csv.reader(file)
+            else:
+                reader = (
+                    next(csv.reader((line,))) if '"' in line else line.rstrip('\r\n').split(',')
+                    for line in file if line.strip()
+                )
+            header = next(reader, [])
+            missing = [col for col in required if col not in header]
+            if missing:
+                print(f"Error: CSV file {file_path} is missing columns: {', '.join(missing)}", file=sys.stderr)
+                sys.exit(1)
+            if pyarrow is not None and os.path.getsize(file_path) >= ARROW_MIN_BYTES:
+                yield from map(Row._make, _iter_arrow_rows(file_path, columns, header))
+                return
+            idx = [header.index(col) if col in header else None for col in columns]
+            width = max((i for i in idx if i is not None), default=-1) + 1
+            if None in idx:
+                # Optional columns missing from the header always read as ''
+                getters = [_blank if i is None else itemgetter(i) for i in idx]
+
+                def getter(row):
+                    return [get(row) for get in getters]
+                make = Row._make
+            else:
+                getter = itemgetter(*idx)
+                make = Row._make if len(idx) > 1 else Row
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row += [''] * (width - len(row))
+                yield make(getter(row))
     except FileNotFoundError:
         print(f"Error: CSV file {file_path} not found", file=sys.stderr)
         sys.exit(1)
@@ -48,11 +158,12 @@ def main():
     # Load environment variables
     veza_api_key = os.getenv('VEZA_API_KEY')
     veza_url = os.getenv('VEZA_URL')
-    if None in (veza_url, veza_api_key):
+    if not veza_url or not veza_api_key:
         print("Unable to locate all environment variables", file=sys.stderr)
         sys.exit(1)
 
-    # Initialize OAA client
+    # Initialize OAA client once; it keeps a pooled HTTPS session that is reused
+    # for the provider lookup/creation and the push below
     veza_con = OAAClient(url=veza_url, api_key=veza_api_key)
 
     # Create CustomIdPProvider instance
@@ -74,70 +185,81 @@ def main():
     groups_file = os.path.join(csv_dir, "idp_groups.csv")
     group_memberships_file = os.path.join(csv_dir, "idp_group_memberships.csv")
 
-    # Read and process users
-    users_data = read_csv_file(users_file)
-    for user in users_data:
-        name = user.get('full_name', user['identity'])
-        custom_idp.add_user(name=name)
-        if user['identity']:
+    # Parse the groups and memberships files on worker threads while users are streamed below
+    executor = ThreadPoolExecutor(max_workers=2)
+    # Set DMI_TRUSTED_CSV=true to parse these files with the split-based fast path
+    strict_csv = os.getenv('DMI_TRUSTED_CSV', '') not in TRUTHY
+    groups_future = executor.submit(list, iter_csv_rows(groups_file, ('name',), strict_csv=strict_csv))
+    memberships_future = executor.submit(
+        list, iter_csv_rows(group_memberships_file, ('user_identity', 'group_name'), strict_csv=strict_csv))
+    executor.shutdown(wait=False)
+
+    # Read and process users in one streaming pass, keeping only the identity -> user name
+    # map that the group memberships below need
+    users_by_identity = {}
+    add_user = custom_idp.add_user
+    users = custom_idp.users
+    for user in iter_csv_rows(users_file, USER_COLUMNS, required=('identity',)):
+        name = user.full_name or user.identity
+        idp_user = add_user(name=name) or users[name]
+        if user.identity:
+            users_by_identity[user.identity] = name
             # Set identity directly via identities list
             try:
-                custom_idp.users[name].identities = [user['identity']]
-                print(f"Debug: Added identity {user['identity']} to user {name}")
+                idp_user.identities = [user.identity]
+                log.debug("Added identity %s to user %s", user.identity, name)
             except AttributeError as e:
                 print(f"Error: Failed to set identities for {name}: {e}", file=sys.stderr)
-                print(f"Debug: CustomIdPUser attributes for {name}: {dir(custom_idp.users[name])}", file=sys.stderr)
+                print(f"Debug: CustomIdPUser attributes for {name}: {dir(idp_user)}", file=sys.stderr)
                 sys.exit(1)
         # Set custom attributes
-        custom_attrs = {attr: user[attr] for attr in ['full_name', 'job_title', 'department'] if user.get(attr)}
+        custom_attrs = {attr: value for attr in USER_PROPERTY_COLUMNS if (value := getattr(user, attr))}
         if custom_attrs:
+            # CustomIdPUser keeps properties private, so they can only be set through set_property
             try:
                 for key, value in custom_attrs.items():
-                    custom_idp.users[name].set_property(key, value)
-                print(f"Set properties for user {name} via set_property: {custom_attrs}")
+                    idp_user.set_property(key, value)
+                log.debug("Set properties for user %s via set_property: %s", name, custom_attrs)
             except Exception as e:
                 print(f"Warning: Failed to set properties via set_property for {name}: {e}", file=sys.stderr)
-                # Fallback to direct properties dictionary
-                try:
-                    for key, value in custom_attrs.items():
-                        custom_idp.users[name].properties[key] = value
-                    print(f"Set properties for user {name} via properties dict: {custom_attrs}")
-                except Exception as e2:
-                    print(f"Warning: Failed to set properties via properties dict for {name}: {e2}", file=sys.stderr)
-                    print(f"Debug: IdP User attributes for {name}: {dir(custom_idp.users[name])}", file=sys.stderr)
-        if user.get('is_active'):
-            custom_idp.users[name].is_active = user['is_active'].lower() == 'true'
+                log.debug("IdP User attributes for %s: %s", name, _LazyDir(idp_user))
+        if user.is_active:
+            idp_user.is_active = user.is_active in TRUTHY
 
     # Read and process groups
-    groups_data = read_csv_file(groups_file)
-    for group in groups_data:
-        group_name = group['name']
-        custom_idp.add_group(name=group_name)
-        # Debug: Inspect group ID
-        group_obj = custom_idp.groups[group_name]
-        group_dict = group_obj.to_dict()
-        group_id = getattr(group_obj, 'id', group_dict.get('id', group_dict.get('name', 'Not found')))
-        print(f"Debug: IdP Group {group_name} ID: {group_id}")
-        print(f"Debug: IdP Group {group_name} to_dict: {group_dict}")
-
-    # Read and process group memberships
-    group_memberships_data = read_csv_file(group_memberships_file)
-    for membership in group_memberships_data:
-        user_identity = membership['user_identity']
-        group_name = membership['group_name']
-        # Map user_identity to full_name
-        user = next((u for u in users_data if u['identity'] == user_identity), None)
-        if not user or user['full_name'] not in custom_idp.users:
+    debug = log.isEnabledFor(logging.DEBUG)
+    add_group = custom_idp.add_group
+    groups = custom_idp.groups
+    for group in groups_future.result():
+        group_name = group.name
+        add_group(name=group_name)
+        if debug:
+            # Debug: Inspect group ID
+            group_obj = groups[group_name]
+            group_dict = group_obj.to_dict()
+            group_id = getattr(group_obj, 'id', group_dict.get('id', group_dict.get('name', 'Not found')))
+            log.debug("IdP Group %s ID: %s", group_name, group_id)
+            log.debug("IdP Group %s to_dict: %s", group_name, group_dict)
+
+    # Read group memberships, collecting each user's groups so they are added in one call
+    groups_by_user = defaultdict(list)
+    for user_identity, group_name in memberships_future.result():
+        # Map user_identity to the user's name
+        name = users_by_identity.get(user_identity)
+        if name is None:
             print(f"Error: User {user_identity} not found for group membership", file=sys.stderr)
             continue
-        if group_name not in custom_idp.groups:
+        if group_name not in groups:
             print(f"Error: Group {group_name} not found for group membership", file=sys.stderr)
             continue
-        custom_idp.users[user['full_name']].add_groups([group_name])
-        print(f"Debug: Added {user['full_name']} to group {group_name}")
+        groups_by_user[name].append(group_name)
+    for name, group_names in groups_by_user.items():
+        users[name].add_groups(group_names)
+        log.debug("Added %s to groups %s", name, group_names)
 
-    # Debug print (corrected)
-    print(f"Debug: CustomIdPProvider payload: {custom_idp.get_payload()}")
+    # Debug: Inspect full payload. push_application builds it again, so only do so when debugging
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("CustomIdPProvider payload: %s", custom_idp.get_payload())
 
     # Push the metadata payload to Veza
     provider_name = "DMI_IDP"
@@ -1,24 +1,16 @@
-import csv
 import json
 import os
+import shutil
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; fall back to the stdlib encoder
+    orjson = None
 
 # Create output directory
 output_dir = 'oaa_files'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-# Load data
-with open('identities.csv', 'r') as f:
-    identities = list(csv.DictReader(f))
-
-with open('resources.csv', 'r') as f:
-    resources = list(csv.DictReader(f))
-
-with open('permissions.csv', 'r') as f:
-    permissions = list(csv.DictReader(f))
-
-with open('entitlements.csv', 'r') as f:
-    entitlements = list(csv.DictReader(f))
+os.makedirs(output_dir, exist_ok=True)
 
 # Create application.json
 app_data = {
@@ -27,12 +19,14 @@ app_data = {
     "description": "Employee management for Dunder Mifflin Paper Company"
 }
 
-with open(os.path.join(output_dir, 'application.json'), 'w') as f:
-    json.dump(app_data, f, indent=2)
+with open(os.path.join(output_dir, 'application.json'), 'wb') as f:
+    if orjson is not None:
+        f.write(orjson.dumps(app_data, option=orjson.OPT_INDENT_2))
+    else:
+        f.write(json.dumps(app_data, indent=2).encode('utf-8'))
 
-# Copy CSV files to output directory
+# Copy CSV files to output directory (shutil uses an in-kernel copy where available)
 for filename in ['identities.csv', 'resources.csv', 'permissions.csv', 'entitlements.csv']:
-    with open(filename, 'r') as infile, open(os.path.join(output_dir, filename), 'w') as outfile:
-        outfile.write(infile.read())
+    shutil.copyfile(filename, os.path.join(output_dir, filename))
 
 print("OAA files generated successfully in 'oaa_files' directory")